@@ -1,8 +1,14 @@
 # app/main.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.routes import document, chat
+from app.utils.vector_db import cpu_threads_per_process, get_vector_db
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import os
+import uvicorn
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +24,7 @@ app = FastAPI(
         "into chat interactions for more precise and context-aware responses."
     ),
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     contact={
         "name": "suNetworks",
         "email": "code.shubham.com@gmail.com",
@@ -34,6 +41,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized document uploads before their body is read
+app.add_middleware(document.UploadSizeLimitMiddleware, path="/api/documents/process")
+
 # Include document and chat routes with tags for better documentation
 app.include_router(
     document.router, 
@@ -52,7 +62,29 @@ app.include_router(
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up the RAG service...")
+    # One process-wide pool for all run_in_executor(None, ...) calls, sized
+    # to this worker's share of the cores
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=cpu_threads_per_process())
+    )
+    # Load the embedding model and vector store in each serving process
+    # before it accepts requests (not in the supervisor process)
+    get_vector_db()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down the RAG service...")
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        # Chat sessions (agent_manager) live in process memory, so a session
+        # started on one worker is unknown to the others; keep a single
+        # worker unless WEB_CONCURRENCY is raised deliberately
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        access_log=False
+    )
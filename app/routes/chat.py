@@ -4,7 +4,8 @@ import uuid
 from app.utils.vector_db import query_embeddings, get_query_embedding
 from app.utils.langchain_agent import generate_response_stream, agent_manager
 from pydantic import BaseModel
-from fastapi.responses import StreamingResponse
+from langchain.schema import Document
+from fastapi.responses import StreamingResponse, ORJSONResponse
 import logging
 
 router = APIRouter()
@@ -51,16 +52,20 @@ async def chat_message(request: ChatMessageRequest):
 
         async def response_generator():
             query_embedding = await get_query_embedding(request.message)
-            if not query_embedding:
+            if query_embedding is None:
                 yield "Failed to generate query embeddings."
                 return
 
-            similar_docs = await query_embeddings(query_embedding)
+            asset_id = agent_manager.agents[request.chat_thread_id].asset_id
+            similar_docs = [
+                Document(page_content=content, metadata=metadata)
+                for content, metadata, _ in await query_embeddings(query_embedding, asset_id=asset_id)
+            ]
             async for response_chunk in generate_response_stream(
-                agent_manager.agents[request.chat_thread_id].asset_id,
+                asset_id,
                 request.message,
                 request.chat_thread_id,
-                similar_docs
+                similar_docs=similar_docs
             ):
                 yield response_chunk
 
@@ -83,7 +88,7 @@ async def get_chat_history(chat_thread_id: str):
             raise HTTPException(status_code=404, detail="Chat thread not found.")
         
         history = agent_manager.get_chat_history(chat_thread_id)
-        return {"chat_thread_id": chat_thread_id, "history": history}
+        return ORJSONResponse({"chat_thread_id": chat_thread_id, "history": history})
     except Exception as e:
         logger.error(f"Error retrieving chat history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -92,7 +97,7 @@ async def get_chat_history(chat_thread_id: str):
 async def get_active_chats():
     """List all active chat sessions."""
     active_chats = list(agent_manager.agents.keys())
-    return {"active_chats": active_chats}
+    return ORJSONResponse({"active_chats": active_chats})
 
 @router.post("/resume/{chat_thread_id}")
 async def resume_chat(chat_thread_id: str):
@@ -120,7 +125,7 @@ async def delete_chat_session(chat_thread_id: str):
 async def list_chat_threads():
     """Retrieve a list of all chat thread IDs."""
     chat_threads = list(agent_manager.agents.keys())
-    return {"chat_threads": chat_threads}
+    return ORJSONResponse({"chat_threads": chat_threads})
 
 @router.get("/metadata/{chat_thread_id}")
 async def get_chat_metadata(chat_thread_id: str):
@@ -135,7 +140,7 @@ async def get_chat_metadata(chat_thread_id: str):
             "agent_type": type(agent_manager.agents[chat_thread_id]).__name__,
             "asset_id": agent_manager.agents[chat_thread_id].asset_id
         }
-        return {"metadata": metadata}
+        return ORJSONResponse({"metadata": metadata})
     except Exception as e:
         logger.error(f"Error retrieving chat metadata: {e}")
         raise HTTPException(status_code=500, detail=str(e))
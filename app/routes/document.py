@@ -1,10 +1,43 @@
 from fastapi import APIRouter, HTTPException, UploadFile
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 from pathlib import Path
+import os
 import uuid
-from app.workers import create_embeddings_worker
+import aiofiles
+from app.workers import embed_document_pipeline
 
 router = APIRouter()
 
+# Uploads are streamed to disk in 1 MB chunks and rejected above this size,
+# up front from Content-Length and again while streaming (for chunked bodies)
+CHUNK_SIZE = 1 << 20
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 200 * 1024 * 1024))
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject uploads to ``path`` whose declared Content-Length exceeds MAX_UPLOAD_SIZE.
+
+    A pure ASGI middleware, because by the time the route handler is called
+    the multipart body has already been received and spooled. Every other
+    request is passed straight through without being wrapped.
+    """
+
+    def __init__(self, app: ASGIApp, path: str):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == self.path:
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > MAX_UPLOAD_SIZE:
+                        response = ORJSONResponse(status_code=413, content={"detail": "File too large."})
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
 @router.post("/process")
 async def process_document(file: UploadFile):
     # Define a directory where the application has write permissions
@@ -13,14 +46,23 @@ async def process_document(file: UploadFile):
 
     file_location = upload_dir / file.filename
 
-    # Save the file to the designated location
-    with open(file_location, "wb") as buffer:
-        buffer.write(await file.read())
+    # Stream the file to the designated location without buffering it in memory
+    written = 0
+    async with aiofiles.open(file_location, "wb") as out:
+        while chunk := await file.read(CHUNK_SIZE):
+            written += len(chunk)
+            if written > MAX_UPLOAD_SIZE:
+                break
+            await out.write(chunk)
+
+    if written > MAX_UPLOAD_SIZE:
+        file_location.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail="File too large.")
 
     # Generate a unique asset ID for the uploaded document
     asset_id = str(uuid.uuid4())
 
-    # Send the file for background processing using the worker
-    create_embeddings_worker.send(str(file_location), asset_id)
+    # Hand extraction, chunking and embedding off to the worker pipeline
+    embed_document_pipeline(str(file_location), asset_id)
 
     return {"message": "File processing initiated.", "file_path": str(file_location), "asset_id": asset_id}
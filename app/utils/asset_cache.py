@@ -0,0 +1,122 @@
+# app/utils/asset_cache.py
+
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AssetVectors:
+    """
+    Memory-mapped chunks of one asset in struct-of-arrays layout.
+
+    vecs.npy     float32[N, dim]  normalized chunk embeddings
+    offsets.npy  uint64[N, 2]     (byte offset, byte length) into content.bin
+    content.bin  UTF-8 chunk texts packed back to back
+    meta.json    asset-level metadata (file_name)
+    """
+
+    def __init__(self, path: Path):
+        meta_file = path / "meta.json"
+        self.metadata: Dict[str, Any] = (
+            json.loads(meta_file.read_text(encoding="utf-8")) if meta_file.exists() else {}
+        )
+        self.vecs = np.load(path / "vecs.npy", mmap_mode="r")
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        self.content = np.memmap(path / "content.bin", dtype=np.uint8, mode="r") if self.offsets.size else None
+
+    def search(self, query_embedding: np.ndarray, top_k: int = 5) -> List[Tuple[int, str, float]]:
+        """Return (chunk_id, content, score) for the top_k chunks by dot product."""
+        count = len(self.vecs)
+        if count == 0:
+            return []
+
+        scores = self.vecs @ np.asarray(query_embedding, dtype=np.float32)
+        if top_k < count:
+            top = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            top = np.arange(count)
+        top = top[np.argsort(-scores[top])]
+
+        return [(int(i), self._text(i), float(scores[i])) for i in top]
+
+    def _text(self, index: int) -> str:
+        offset, length = (int(value) for value in self.offsets[index])
+        return bytes(self.content[offset:offset + length]).decode("utf-8")
+
+class AssetVectorCache:
+    """Per-asset on-disk chunk caches, searched locally instead of via the vector store."""
+
+    def __init__(self, root: str = "./assets", max_open: int = 64):
+        self.root = Path(root)
+        self.max_open = max_open
+        # Bounded LRU of open assets; evicted entries release their mmaps
+        self._loaded: "OrderedDict[str, AssetVectors]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def write(self, asset_id: str, texts: List[str], vectors: np.ndarray, file_name: Optional[str] = None):
+        """Persist an asset's chunk texts, embeddings and file name."""
+        encoded = [text.encode("utf-8") for text in texts]
+        lengths = np.fromiter((len(data) for data in encoded), dtype=np.uint64, count=len(encoded))
+        offsets = np.empty((len(encoded), 2), dtype=np.uint64)
+        offsets[:, 0] = np.cumsum(lengths) - lengths
+        offsets[:, 1] = lengths
+
+        # Write into a temporary directory and swap it in, so readers never see a partial asset
+        target = self.root / asset_id
+        staging = self.root / f".{asset_id}.tmp"
+        staging.mkdir(parents=True, exist_ok=True)
+        with open(staging / "content.bin", "wb") as file:
+            file.write(b"".join(encoded))
+        np.save(staging / "offsets.npy", offsets)
+        with open(staging / "meta.json", "w", encoding="utf-8") as file:
+            json.dump({"file_name": file_name}, file)
+        np.save(staging / "vecs.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+
+        if target.exists():
+            shutil.rmtree(target)
+        os.replace(staging, target)
+        with self._lock:
+            self._loaded.pop(asset_id, None)
+        logger.info(f"Cached {len(texts)} chunks for asset: {asset_id}")
+
+    def get(self, asset_id: str) -> Optional[AssetVectors]:
+        """Return the memory-mapped asset, or None if it hasn't been cached."""
+        with self._lock:
+            asset = self._loaded.get(asset_id)
+            if asset is not None:
+                self._loaded.move_to_end(asset_id)
+                return asset
+
+            path = self.root / asset_id
+            if not (path / "vecs.npy").exists():
+                return None
+            asset = AssetVectors(path)
+            self._loaded[asset_id] = asset
+            while len(self._loaded) > self.max_open:
+                self._loaded.popitem(last=False)
+            return asset
+
+    def search(
+        self,
+        asset_id: str,
+        query_embedding: np.ndarray,
+        top_k: int = 5
+    ) -> Optional[List[Tuple[str, Dict[str, Any], float]]]:
+        """Search one asset's chunks; None when the asset isn't cached locally."""
+        asset = self.get(asset_id)
+        if asset is None:
+            return None
+        return [
+            (content, {**asset.metadata, "asset_id": asset_id, "chunk_index": chunk_id}, score)
+            for chunk_id, content, score in asset.search(query_embedding, top_k)
+        ]
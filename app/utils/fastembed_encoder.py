@@ -0,0 +1,30 @@
+# app/utils/fastembed_encoder.py
+
+from typing import List, Optional, Union
+
+import numpy as np
+from fastembed import TextEmbedding
+
+from app.utils.model_ids import resolve_model_id
+
+class FastEmbedEncoder:
+    """SentenceTransformer-compatible encode() on top of fastembed's ONNX models and Rust tokenizer."""
+
+    def __init__(self, model_name: str, cache_dir: str = "./models", threads: Optional[int] = None):
+        self.model = TextEmbedding(
+            model_name=resolve_model_id(model_name),
+            cache_dir=cache_dir,
+            threads=threads
+        )
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        **kwargs
+    ) -> np.ndarray:
+        """Encode one text (returns 1-D) or a list of texts (returns 2-D), like SentenceTransformer."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.asarray(list(self.model.embed(texts, batch_size=batch_size)), dtype=np.float32)
+        return embeddings[0] if single else embeddings
@@ -0,0 +1,182 @@
+# app/utils/hnsw_index.py
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import hnswlib
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class HnswIndex:
+    """
+    In-process cosine ANN index with payloads, persisted to a directory.
+
+    Used in place of Qdrant for single-node deployments. Point ids are
+    arbitrary strings, mapped internally to hnswlib's integer labels.
+
+    The API and every Dramatiq worker process may open the same directory.
+    Writes are transactions under an exclusive file lock: the writer
+    reloads the index if another process saved a newer one, adds its
+    points and saves before releasing the lock. Searches reload the index,
+    under a shared lock, whenever the files on disk have changed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dim: int,
+        m: int = 16,
+        ef_construct: int = 128,
+        ef_search: int = 64,
+        initial_capacity: int = 10000
+    ):
+        self.path = Path(path)
+        self.dim = dim
+        self.m = m
+        self.ef_construct = ef_construct
+        self.ef_search = ef_search
+        self.initial_capacity = initial_capacity
+        self._index_file = self.path / "index.bin"
+        self._payload_file = self.path / "payloads.json"
+        self._lock_file = self.path / ".lock"
+        self.path.mkdir(parents=True, exist_ok=True)
+        # flock doesn't exclude threads of the same process, so writers also
+        # serialize on _write_lock and reloads on _reload_lock; searches only
+        # wait for _resize_lock, held while the index is resized or swapped
+        self._write_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._resize_lock = threading.Lock()
+        with self._file_lock(fcntl.LOCK_SH):
+            self._load()
+
+    @contextmanager
+    def _file_lock(self, operation: int):
+        with open(self._lock_file, "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _disk_version(self) -> Optional[Tuple[int, int]]:
+        # save() renames a new file into place, so the inode changes on every save
+        try:
+            stat = self._index_file.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def _load(self):
+        """Replace the in-memory index with the saved one (or an empty one); the caller holds the file lock."""
+        version = self._disk_version()
+        index = hnswlib.Index(space="cosine", dim=self.dim)
+        if version is not None:
+            index.load_index(str(self._index_file), allow_replace_deleted=True)
+            with open(self._payload_file, "r", encoding="utf-8") as file:
+                stored = json.load(file)
+            payloads = {int(label): payload for label, payload in stored["payloads"].items()}
+            labels = stored["labels"]
+            logger.info(f"Loaded HNSW index with {len(labels)} points from {self.path}")
+        else:
+            index.init_index(
+                max_elements=self.initial_capacity,
+                M=self.m,
+                ef_construction=self.ef_construct,
+                allow_replace_deleted=True
+            )
+            payloads, labels = {}, {}
+        index.set_ef(self.ef_search)
+
+        with self._resize_lock:
+            self.index = index
+            self._payloads: Dict[int, Dict[str, Any]] = payloads
+            self._labels: Dict[str, int] = labels
+            self._version = version
+
+    def _refresh(self):
+        """Reload the index if another process has saved a newer one."""
+        if self._disk_version() == self._version:
+            return
+        with self._reload_lock, self._file_lock(fcntl.LOCK_SH):
+            if self._disk_version() != self._version:
+                self._load()
+
+    def add(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]):
+        """Insert or replace points and persist them, as one transaction across processes."""
+        with self._write_lock, self._file_lock(fcntl.LOCK_EX):
+            if self._disk_version() != self._version:
+                self._load()
+            self._upsert(ids, vectors, payloads)
+            self._save()
+            self._version = self._disk_version()
+
+    def _upsert(self, ids: List[str], vectors: np.ndarray, payloads: List[Dict[str, Any]]):
+        labels = []
+        for point_id in ids:
+            label = self._labels.get(point_id)
+            if label is None:
+                label = len(self._labels)
+                self._labels[point_id] = label
+            labels.append(label)
+
+        required = len(self._labels)
+        if required > self.index.get_max_elements():
+            with self._resize_lock:
+                self.index.resize_index(max(required, self.index.get_max_elements() * 2))
+
+        self.index.add_items(np.asarray(vectors, dtype=np.float32), labels)
+        for label, payload in zip(labels, payloads):
+            self._payloads[label] = payload
+
+    def search(
+        self,
+        vector: np.ndarray,
+        top_k: int = 5,
+        payload_filter: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """Return (payload, cosine similarity) pairs for the nearest points, optionally only those whose payload matches."""
+        self._refresh()
+        with self._resize_lock:
+            payloads = self._payloads
+            label_filter = None
+            if payload_filter is None:
+                count = self.index.get_current_count()
+            else:
+                # hnswlib fails when fewer than k points pass the filter, so k
+                # is capped at the number of matching points (items are copied
+                # first, since a writer in this process may be adding payloads)
+                allowed = {label for label, payload in list(payloads.items()) if payload_filter(payload)}
+                count = len(allowed)
+                label_filter = allowed.__contains__
+            if count == 0:
+                return []
+            labels, distances = self.index.knn_query(
+                np.asarray(vector, dtype=np.float32),
+                k=min(top_k, count),
+                filter=label_filter
+            )
+        return [
+            (payloads.get(int(label), {}), 1.0 - float(distance))
+            for label, distance in zip(labels[0], distances[0])
+        ]
+
+    def _save(self):
+        # Each file is written to a temp path and renamed into place; payloads
+        # go first so an index file on disk always has its payloads
+        payload_tmp = self._payload_file.with_suffix(".json.tmp")
+        with open(payload_tmp, "w", encoding="utf-8") as file:
+            json.dump({"labels": self._labels, "payloads": self._payloads}, file)
+        os.replace(payload_tmp, self._payload_file)
+
+        index_tmp = self._index_file.with_suffix(".bin.tmp")
+        self.index.save_index(str(index_tmp))
+        os.replace(index_tmp, self._index_file)
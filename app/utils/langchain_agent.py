@@ -1,8 +1,9 @@
-import asyncio
+from collections import deque
+from functools import lru_cache
 from typing import List, Dict, Optional
 from langchain.schema import Document
 import cohere
-import openai
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import os
 import logging
@@ -14,71 +15,79 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=1)
+def get_openai_client(api_key: str) -> AsyncOpenAI:
+    """Return a shared async OpenAI client (one pooled HTTP connection set per process)."""
+    return AsyncOpenAI(api_key=api_key)
+
+@lru_cache(maxsize=1)
+def get_cohere_client(api_key: str) -> cohere.AsyncClient:
+    """Return a shared async Cohere client (one pooled HTTP connection set per process)."""
+    return cohere.AsyncClient(api_key)
+
 class EnhancedAgent:
     def __init__(self, asset_id: str, language_model: str = "openai"):
         self.asset_id = asset_id
         self.language_model = language_model.lower()
-        self.history = []  # Store chat history
+        # Store chat history, keeping only the most recent MAX_HISTORY turns
+        self.history = deque(maxlen=int(os.getenv("MAX_HISTORY", 200)))
 
         if self.language_model == "cohere":
             cohere_api_key = os.getenv("COHERE_API_KEY")
             if not cohere_api_key:
                 raise ValueError("COHERE_API_KEY not found in environment variables.")
-            self.client = cohere.Client(cohere_api_key)
+            self.client = get_cohere_client(cohere_api_key)
         elif self.language_model == "openai":
             openai_api_key = os.getenv("OPENAI_API_KEY")
             if not openai_api_key:
                 raise ValueError("OPENAI_API_KEY not found in environment variables.")
-            openai.api_key = openai_api_key
+            self.client = get_openai_client(openai_api_key)
         else:
             raise ValueError("Invalid language_model specified. Choose 'cohere' or 'openai'.")
 
     async def generate_response_stream(self, message: str, similar_docs: Optional[List[Document]] = None):
-        """Stream the generated response in chunks with document context."""
+        """Stream the generated response as the provider produces it, with document context."""
+        output = []
         try:
             # Include relevant document context in the prompt if available
             document_context = "\n\n".join([f"Context from document: {doc.page_content[:500]}" for doc in similar_docs or []])
             combined_prompt = f"{document_context}\nUser: {message}\nNote: Only respond using the information found in the provided context above."
 
             if self.language_model == "cohere":
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: self.client.generate(
-                        model='command-xlarge-nightly',
-                        prompt=combined_prompt,
-                        max_tokens=300,
-                        temperature=0
-                    )
-                )
-                output = response.generations[0].text
+                async for event in self.client.chat_stream(
+                    model="command-r",
+                    message=combined_prompt,
+                    max_tokens=300,
+                    temperature=0
+                ):
+                    if event.event_type == "text-generation" and event.text:
+                        output.append(event.text)
+                        yield event.text
             elif self.language_model == "openai":
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: openai.Completion.create(
-                        engine="text-davinci-003",
-                        prompt=combined_prompt,
-                        max_tokens=300,
-                        temperature=0
-                    )
+                stream = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=[{"role": "user", "content": combined_prompt}],
+                    max_tokens=300,
+                    temperature=0,
+                    stream=True
                 )
-                output = response.choices[0]['text']
+                async for event in stream:
+                    content = event.choices[0].delta.content if event.choices else None
+                    if content:
+                        output.append(content)
+                        yield content
             else:
-                output = "Invalid language model."
+                output.append("Invalid language model.")
+                yield output[-1]
 
-            self.history.append({"user": message, "response": output})
-            for chunk in self._chunk_response(output, chunk_size=50):
-                yield chunk
+            self.history.append({"user": message, "response": "".join(output)})
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             yield "I apologize, but I encountered an error while processing your request."
 
-    def _chunk_response(self, text: str, chunk_size: int = 50):
-        """Split response into smaller chunks for streaming."""
-        return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-
     def get_history(self):
         """Retrieve chat history."""
-        return self.history
+        return list(self.history)
 
 class AgentManager:
     def __init__(self):
@@ -0,0 +1,5 @@
+# app/utils/model_ids.py
+
+def resolve_model_id(model_name: str) -> str:
+    """Map short sentence-transformers names (e.g. all-MiniLM-L6-v2) to their hub id."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
@@ -0,0 +1,131 @@
+# app/utils/onnx_encoder.py
+
+import os
+import logging
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoTokenizer
+
+from app.utils.model_ids import resolve_model_id
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def export_quantized_onnx(model_id: str, output_path: Path, max_length: int = 256):
+    """Export a transformer encoder to ONNX and quantize its weights to int8."""
+    import torch
+    from transformers import AutoModel
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModel.from_pretrained(model_id).eval()
+    dummy = tokenizer(
+        ["export"],
+        padding=True,
+        truncation=True,
+        max_length=max_length,
+        return_tensors="pt"
+    )
+    input_names = list(dummy.keys())
+    # Per-process temp files, renamed into place at the end, so concurrent
+    # exports never collide and readers never open a half-written model
+    fp32_path = output_path.with_suffix(f".{os.getpid()}.fp32.onnx")
+    int8_path = output_path.with_suffix(f".{os.getpid()}.int8.onnx")
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(dummy[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                "last_hidden_state": {0: "batch", 1: "sequence"}
+            },
+            opset_version=14
+        )
+
+    try:
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+        os.replace(int8_path, output_path)
+    finally:
+        fp32_path.unlink(missing_ok=True)
+        int8_path.unlink(missing_ok=True)
+    logger.info(f"Exported int8 ONNX model for {model_id} to {output_path}")
+
+class OnnxSentenceEncoder:
+    """Int8 ONNX Runtime replacement for SentenceTransformer.encode (mean pooling + L2 norm)."""
+
+    def __init__(
+        self,
+        model_name: str,
+        model_dir: str = "./models",
+        max_length: int = 256,
+        threads: Optional[int] = None
+    ):
+        self.model_id = resolve_model_id(model_name)
+        self.max_length = max_length
+        model_path = Path(model_dir) / self.model_id.replace("/", "__") / "model.onnx"
+
+        if not model_path.exists():
+            export_quantized_onnx(self.model_id, model_path, max_length)
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.intra_op_num_threads = threads or os.cpu_count() or 1
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+        self.session = ort.InferenceSession(
+            str(model_path),
+            sess_options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        **kwargs
+    ) -> np.ndarray:
+        """Encode one text (returns 1-D) or a list of texts (returns 2-D), like SentenceTransformer."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.session.get_outputs()[0].shape[-1] or 0), dtype=np.float32)
+
+        batches = [
+            self._encode_batch(texts[i:i + batch_size])
+            for i in range(0, len(texts), batch_size)
+        ]
+        embeddings = np.concatenate(batches, axis=0)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        inputs = {
+            name: tokens[name].astype(np.int64)
+            for name in tokens.keys()
+            if name in self._input_names
+        }
+        last_hidden_state = self.session.run(None, inputs)[0]
+
+        # Mean-pool over real tokens as one batched contraction (no masked
+        # copy of the hidden states), then L2-normalize
+        mask = tokens["attention_mask"].astype(np.float32)
+        summed = np.einsum("bsh,bs->bh", last_hidden_state, mask, optimize=True)
+        pooled = summed / np.clip(mask.sum(axis=1, keepdims=True), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
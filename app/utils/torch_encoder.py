@@ -0,0 +1,74 @@
+# app/utils/torch_encoder.py
+
+import logging
+from typing import List, Optional, Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import AutoModel, AutoTokenizer
+
+from app.utils.model_ids import resolve_model_id
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class TorchSentenceEncoder:
+    """PyTorch encoder that skips SentenceTransformer.encode's per-call Python overhead."""
+
+    def __init__(
+        self,
+        model_name: str,
+        max_length: int = 256,
+        compile_model: bool = True,
+        threads: Optional[int] = None
+    ):
+        if threads:
+            torch.set_num_threads(threads)
+        self.model_id = resolve_model_id(model_name)
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+        model = AutoModel.from_pretrained(self.model_id).eval()
+
+        if compile_model:
+            try:
+                model = torch.compile(model, dynamic=True)
+            except Exception as e:
+                logger.warning(f"torch.compile unavailable, using eager model: {str(e)}")
+        self.model = model
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        **kwargs
+    ) -> np.ndarray:
+        """Encode one text (returns 1-D) or a list of texts (returns 2-D), like SentenceTransformer."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.model.config.hidden_size), dtype=np.float32)
+
+        batches = [
+            self._encode_batch(texts[i:i + batch_size])
+            for i in range(0, len(texts), batch_size)
+        ]
+        embeddings = np.concatenate(batches, axis=0)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt"
+        )
+        with torch.inference_mode():
+            out = self.model(**tokens).last_hidden_state
+            mask = tokens["attention_mask"].unsqueeze(-1).to(out.dtype)
+            pooled = (out * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            pooled = F.normalize(pooled, p=2, dim=1)
+        # Single conversion at the end; no per-element tolist()
+        return pooled.cpu().numpy().astype(np.float32, copy=False)
@@ -1,23 +1,42 @@
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
-    PointStruct,
     VectorParams,
+    HnswConfigDiff,
+    OptimizersConfigDiff,
+    PayloadSelectorInclude,
     Distance,
     Filter,
     FieldCondition,
+    MatchValue,
+    PayloadSchemaType,
     Range
 )
 from qdrant_client.http.models import UpdateStatus
-from sentence_transformers import SentenceTransformer
+from app.utils.hnsw_index import HnswIndex
+from app.utils.asset_cache import AssetVectorCache
 import numpy as np
-from typing import List, Dict, Optional, Any
+from typing import TYPE_CHECKING, List, Dict, Optional, Any, Tuple, Union
 from langchain.schema import Document
 from datetime import datetime
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
 import logging
+import os
 from dataclasses import dataclass
 from enum import Enum
+from dotenv import load_dotenv
+
+# Encoder backends are imported lazily in _load_encoder so only the
+# configured one's runtime (fastembed, onnxruntime+transformers or torch) loads
+if TYPE_CHECKING:
+    from app.utils.fastembed_encoder import FastEmbedEncoder
+    from app.utils.onnx_encoder import OnnxSentenceEncoder
+    from app.utils.torch_encoder import TorchSentenceEncoder
+
+# Load environment variables
+load_dotenv()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -39,6 +58,11 @@ class ChatMessage:
     conversation_id: str
     metadata: Optional[Dict[str, Any]] = None
 
+def cpu_threads_per_process() -> int:
+    """CPU threads one server process may use, splitting cores across WEB_CONCURRENCY workers."""
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // workers)
+
 # Define VectorDBConfig before using it in the EnhancedVectorDB class
 class VectorDBConfig:
     def __init__(
@@ -48,7 +72,21 @@ class VectorDBConfig:
         distance: Distance = Distance.COSINE,
         model_name: str = "all-MiniLM-L6-v2",
         batch_size: int = 100,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        query_cache_size: int = 1024,
+        encode_batch_size: int = 32,
+        encode_max_latency_ms: float = 5.0,
+        model_dir: str = "./models",
+        encoder_backend: str = "fastembed",
+        prefer_grpc: bool = True,
+        grpc_port: int = 6334,
+        max_parallel_upserts: int = 8,
+        storage_path: str = "./qdrant_storage",
+        hnsw_m: int = 16,
+        hnsw_ef_construct: int = 128,
+        memmap_threshold: int = 20000,
+        asset_cache_dir: str = "./assets",
+        encoder_threads: Optional[int] = None
     ):
         self.collection_name = collection_name
         self.vector_size = vector_size
@@ -56,30 +94,216 @@ class VectorDBConfig:
         self.model_name = model_name
         self.batch_size = batch_size
         self.similarity_threshold = similarity_threshold
+        self.query_cache_size = query_cache_size
+        self.encode_batch_size = encode_batch_size
+        self.encode_max_latency_ms = encode_max_latency_ms
+        self.model_dir = model_dir
+        self.encoder_backend = encoder_backend
+        self.prefer_grpc = prefer_grpc
+        self.grpc_port = grpc_port
+        self.max_parallel_upserts = max_parallel_upserts
+        self.storage_path = storage_path
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.memmap_threshold = memmap_threshold
+        self.asset_cache_dir = asset_cache_dir
+        self.encoder_threads = encoder_threads or cpu_threads_per_process()
+
+# Bounded LRU cache of query embeddings keyed by normalized query text
+class QueryEmbeddingCache:
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split()).lower()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.normalize(text)
+        embedding = self._entries.get(key)
+        if embedding is not None:
+            self._entries.move_to_end(key)
+        return embedding
+
+    def put(self, text: str, embedding: np.ndarray) -> np.ndarray:
+        """Store a read-only float32 copy of the embedding and return it."""
+        embedding = np.array(embedding, dtype=np.float32)
+        # Cached arrays are handed to every caller, so in-place changes must fail
+        embedding.setflags(write=False)
+        if self.max_size <= 0:
+            return embedding
+        key = self.normalize(text)
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return embedding
+
+# Coalesces single-text encode requests arriving close together into one batched model call
+class EncoderBatcher:
+    def __init__(
+        self,
+        model: Union["FastEmbedEncoder", "OnnxSentenceEncoder", "TorchSentenceEncoder"],
+        max_batch_size: int = 32,
+        max_latency_ms: float = 5.0
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        # One queue + drain task per event loop (API loop, each worker thread's loop)
+        self._queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Queue]" = weakref.WeakKeyDictionary()
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]" = weakref.WeakKeyDictionary()
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Encode a single text, sharing the model call with concurrent requests."""
+        loop = asyncio.get_running_loop()
+        queue = self._ensure_worker(loop)
+        future = loop.create_future()
+        await queue.put((text, future))
+        return await future
+
+    def _ensure_worker(self, loop: asyncio.AbstractEventLoop) -> asyncio.Queue:
+        task = self._tasks.get(loop)
+        if task is None or task.done():
+            queue = asyncio.Queue()
+            self._queues[loop] = queue
+            self._tasks[loop] = loop.create_task(self._run(loop, queue))
+        return self._queues[loop]
+
+    async def _collect_batch(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        queue: asyncio.Queue
+    ) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await queue.get()]
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        while True:
+            batch = await self._collect_batch(loop, queue)
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = await loop.run_in_executor(
+                    None,
+                    lambda: self.model.encode(
+                        texts,
+                        batch_size=len(texts),
+                        convert_to_numpy=True,
+                        show_progress_bar=False
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Error encoding batch of {len(texts)} texts: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
 
 # EnhancedVectorDB class definition
 class EnhancedVectorDB:
     def __init__(
         self,
-        qdrant_url: str = ":memory:",
+        qdrant_url: Optional[str] = None,
         config: Optional[VectorDBConfig] = None
     ):
         self.config = config or VectorDBConfig()
-        self.client = QdrantClient(qdrant_url)
-        self.model = SentenceTransformer(self.config.model_name)
-        self._initialize_collection()
-        self._executor = ThreadPoolExecutor(max_workers=4)
+        self.client: Optional[QdrantClient] = None
+        self.index: Optional[HnswIndex] = None
+        if qdrant_url:
+            self.client = QdrantClient(
+                qdrant_url,
+                prefer_grpc=self.config.prefer_grpc,
+                grpc_port=self.config.grpc_port
+            )
+            self._initialize_collection()
+        else:
+            # In-process HNSW index persisted to disk for single-node setups without a Qdrant server
+            self.index = HnswIndex(
+                os.path.join(self.config.storage_path, self.config.collection_name),
+                dim=self.config.vector_size,
+                m=self.config.hnsw_m,
+                ef_construct=self.config.hnsw_ef_construct
+            )
+        self.model = self._load_encoder()
+        self.query_cache = QueryEmbeddingCache(self.config.query_cache_size)
+        self.asset_cache = AssetVectorCache(self.config.asset_cache_dir)
+        self.batcher = EncoderBatcher(
+            self.model,
+            max_batch_size=self.config.encode_batch_size,
+            max_latency_ms=self.config.encode_max_latency_ms
+        )
+
+    def _load_encoder(self) -> Union["FastEmbedEncoder", "OnnxSentenceEncoder", "TorchSentenceEncoder"]:
+        """Load the embedding model for the configured backend ('fastembed', 'onnx' or 'torch')."""
+        backend = self.config.encoder_backend.lower()
+        if backend == "fastembed":
+            from app.utils.fastembed_encoder import FastEmbedEncoder
+            return FastEmbedEncoder(
+                self.config.model_name,
+                cache_dir=self.config.model_dir,
+                threads=self.config.encoder_threads
+            )
+        elif backend == "onnx":
+            from app.utils.onnx_encoder import OnnxSentenceEncoder
+            return OnnxSentenceEncoder(
+                self.config.model_name,
+                model_dir=self.config.model_dir,
+                threads=self.config.encoder_threads
+            )
+        elif backend == "torch":
+            from app.utils.torch_encoder import TorchSentenceEncoder
+            return TorchSentenceEncoder(self.config.model_name, threads=self.config.encoder_threads)
+        raise ValueError(f"Invalid encoder_backend: {self.config.encoder_backend}. Choose 'fastembed', 'onnx' or 'torch'.")
 
     def _initialize_collection(self):
         """Initialize the collection with proper schema and indexing."""
         try:
-            # Create or recreate the collection with specified vector parameters
-            self.client.recreate_collection(
+            # Only create the collection if it does not exist yet, so that
+            # existing embeddings are never wiped on startup
+            existing = {
+                collection.name
+                for collection in self.client.get_collections().collections
+            }
+            if self.config.collection_name in existing:
+                logger.info(f"Using existing collection: {self.config.collection_name}")
+                return
+
+            self.client.create_collection(
                 collection_name=self.config.collection_name,
                 vectors_config=VectorParams(
                     size=self.config.vector_size,
-                    distance=self.config.distance
-                )
+                    distance=self.config.distance,
+                    on_disk=True
+                ),
+                hnsw_config=HnswConfigDiff(
+                    m=self.config.hnsw_m,
+                    ef_construct=self.config.hnsw_ef_construct,
+                    on_disk=True
+                ),
+                optimizers_config=OptimizersConfigDiff(
+                    memmap_threshold=self.config.memmap_threshold
+                ),
+                on_disk_payload=True
+            )
+            # Chat searches filter on the asset, so index that payload field
+            self.client.create_payload_index(
+                collection_name=self.config.collection_name,
+                field_name="metadata.asset_id",
+                field_schema=PayloadSchemaType.KEYWORD
             )
             logger.info(f"Successfully initialized collection: {self.config.collection_name}")
         except Exception as e:
@@ -88,43 +312,54 @@ class EnhancedVectorDB:
 
     async def embed_messages_batch(
         self,
-        messages: List[ChatMessage]
+        messages: List[ChatMessage],
+        wait: bool = True,
+        asset_id: Optional[str] = None
     ) -> bool:
-        """Batch process and store multiple chat messages."""
+        """
+        Batch process and store multiple chat messages.
+
+        All messages are encoded first, then stored: Qdrant batches are
+        upserted concurrently, up to ``max_parallel_upserts`` at a time,
+        while the local HNSW index is updated and saved once. Pass
+        ``wait=False`` when the points don't need to be searchable as soon
+        as this returns. When ``asset_id`` is given, the messages are also
+        written to that asset's local memory-mapped cache.
+        """
         try:
-            # Process messages in batches
-            for i in range(0, len(messages), self.config.batch_size):
-                batch = messages[i:i + self.config.batch_size]
-                
-                # Generate embeddings for the batch
-                texts = [msg.content for msg in batch]
-                embeddings = await asyncio.get_event_loop().run_in_executor(
-                    self._executor,
-                    lambda: self.model.encode(texts, show_progress_bar=False)
-                )
+            loop = asyncio.get_event_loop()
+            embeddings = await loop.run_in_executor(
+                None,
+                lambda: self._encode([msg.content for msg in messages])
+            )
+            ids = [msg.message_id for msg in messages]
+            payloads = [
+                {
+                    "message_type": msg.message_type.value,
+                    "timestamp": int(msg.timestamp.timestamp()),
+                    "conversation_id": msg.conversation_id,
+                    "message_id": msg.message_id,
+                    "content": msg.content,
+                    "metadata": msg.metadata or {}
+                }
+                for msg in messages
+            ]
 
-                # Create points for the batch
-                points = [
-                    PointStruct(
-                        id=msg.message_id,
-                        vector=embedding.tolist(),
-                        payload={
-                            "message_type": msg.message_type.value,
-                            "timestamp": int(msg.timestamp.timestamp()),
-                            "conversation_id": msg.conversation_id,
-                            "message_id": msg.message_id,
-                            "content": msg.content,
-                            "metadata": msg.metadata or {}
-                        }
-                    )
-                    for msg, embedding in zip(batch, embeddings)
-                ]
+            if self.index is not None:
+                await loop.run_in_executor(None, lambda: self.index.add(ids, embeddings, payloads))
+            else:
+                await self._upload_batches(ids, embeddings, payloads, wait)
 
-                # Store the batch
-                self.client.upsert(
-                    collection_name=self.config.collection_name,
-                    points=points,
-                    wait=True
+            if asset_id is not None:
+                file_name = (messages[0].metadata or {}).get("file_name") if messages else None
+                await loop.run_in_executor(
+                    None,
+                    lambda: self.asset_cache.write(
+                        asset_id,
+                        [msg.content for msg in messages],
+                        embeddings,
+                        file_name=file_name
+                    )
                 )
 
             logger.info(f"Successfully embedded {len(messages)} messages")
@@ -133,60 +368,155 @@ class EnhancedVectorDB:
             logger.error(f"Error in batch embedding: {str(e)}")
             return False
 
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in one model call; the model already uses every core it was given."""
+        if not texts:
+            return np.empty((0, self.config.vector_size), dtype=np.float32)
+        return np.asarray(
+            self.model.encode(texts, batch_size=self.config.encode_batch_size, show_progress_bar=False),
+            dtype=np.float32
+        )
+
+    async def _upload_batches(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        payloads: List[Dict[str, Any]],
+        wait: bool
+    ):
+        """Upload points to Qdrant in ``batch_size`` slices, up to ``max_parallel_upserts`` at a time."""
+        loop = asyncio.get_event_loop()
+        step = self.config.batch_size
+        starts = list(range(0, len(ids), step))
+        parallelism = max(1, self.config.max_parallel_upserts)
+        for i in range(0, len(starts), parallelism):
+            await asyncio.gather(*[
+                loop.run_in_executor(
+                    None,
+                    self._upload,
+                    ids[start:start + step],
+                    embeddings[start:start + step],
+                    payloads[start:start + step],
+                    wait
+                )
+                for start in starts[i:i + parallelism]
+            ])
+
+    def _upload(self, ids: List[str], embeddings: np.ndarray, payloads: List[Dict[str, Any]], wait: bool):
+        # The client takes the float32 matrix as-is, so the vectors never
+        # become per-element Python floats
+        self.client.upload_collection(
+            collection_name=self.config.collection_name,
+            vectors=embeddings,
+            payload=payloads,
+            ids=ids,
+            batch_size=len(ids),
+            wait=wait
+        )
+
     async def query_embeddings(
         self,
-        query_embedding: List[float],
-        top_k: int = 5
-    ) -> List[Dict[str, Any]]:
-        """Query embeddings for similarity search."""
+        query_embedding: np.ndarray,
+        top_k: int = 5,
+        asset_id: Optional[str] = None
+    ) -> List[Tuple[str, Dict[str, Any], float]]:
+        """Query embeddings for similarity search, returning (content, metadata, score) tuples.
+
+        When ``asset_id`` is given, only that asset's chunks are searched.
+        """
         try:
-            # Perform search in Qdrant with given query embeddings
+            if self.index is not None:
+                payload_filter = (
+                    (lambda payload: (payload.get('metadata') or {}).get('asset_id') == asset_id)
+                    if asset_id is not None
+                    else None
+                )
+                hits = await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    lambda: self.index.search(query_embedding, top_k, payload_filter)
+                )
+                return [
+                    (payload.get('content', ''), payload.get('metadata') or {}, score)
+                    for payload, score in hits
+                ]
+
+            query_filter = (
+                Filter(must=[FieldCondition(key="metadata.asset_id", match=MatchValue(value=asset_id))])
+                if asset_id is not None
+                else None
+            )
+            # Perform search in Qdrant, fetching only the payload fields we use
             results = await asyncio.get_event_loop().run_in_executor(
-                self._executor,
-                lambda: self.client.search(
+                None,
+                lambda: self.client.query_points(
                     collection_name=self.config.collection_name,
-                    query_vector=query_embedding,
-                    limit=top_k
-                )
+                    query=query_embedding,
+                    query_filter=query_filter,
+                    limit=top_k,
+                    with_payload=PayloadSelectorInclude(include=["content", "metadata"]),
+                    with_vectors=False
+                ).points
             )
-            
-            # Format results to match the expected structure
-            formatted_results = [
-                {
-                    'payload': {
-                        'content': hit.payload.get('content', ''),
-                        'file_name': hit.payload.get('metadata', {}).get('file_name', 'Unknown'),
-                        **hit.payload.get('metadata', {})
-                    },
-                    'score': hit.score
-                }
+
+            return [
+                (hit.payload.get('content', ''), hit.payload.get('metadata') or {}, hit.score)
                 for hit in results
             ]
-            
-            return formatted_results
 
         except Exception as e:
             logger.error(f"Error querying embeddings: {str(e)}")
             return []
 
+@lru_cache(maxsize=1)
+def get_vector_db() -> EnhancedVectorDB:
+    """Return the process-wide vector database, created on first use."""
+    qdrant_host = os.getenv("QDRANT_HOST")
+    qdrant_url = f"http://{qdrant_host}:{os.getenv('QDRANT_PORT', '6333')}" if qdrant_host else None
+    return EnhancedVectorDB(
+        qdrant_url=qdrant_url,
+        config=VectorDBConfig(
+            collection_name="documents",
+            similarity_threshold=0.7,
+            batch_size=50
+        )
+    )
+
 # Export the query_embeddings method for use in other parts of the application
-async def query_embeddings(query_embedding: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
-    """Query embeddings using the vector database asynchronously."""
-    vector_db_instance = EnhancedVectorDB()  # Assuming you create an instance of EnhancedVectorDB with proper config
-    return await vector_db_instance.query_embeddings(query_embedding, top_k)
+async def query_embeddings(
+    query_embedding: np.ndarray,
+    top_k: int = 5,
+    asset_id: Optional[str] = None
+) -> List[Tuple[str, Dict[str, Any], float]]:
+    """Query embeddings using the vector database asynchronously.
 
+    When ``asset_id`` is given, only that asset's chunks are searched: in
+    process from its local chunk cache if there is one, otherwise in the
+    vector store with a filter on the asset.
+    """
+    vector_db_instance = get_vector_db()
+    if asset_id is not None:
+        results = await asyncio.get_event_loop().run_in_executor(
+            None,
+            lambda: vector_db_instance.asset_cache.search(asset_id, query_embedding, top_k)
+        )
+        if results is not None:
+            return results
+    return await vector_db_instance.query_embeddings(query_embedding, top_k, asset_id)
 
-async def get_query_embedding(text: str) -> List[float]:
-    """Generate embeddings for a given text."""
+
+async def get_query_embedding(text: str) -> Optional[np.ndarray]:
+    """Generate a float32 embedding for a given text, or None on failure."""
     try:
-        vector_db_instance = EnhancedVectorDB()  # Create an instance of EnhancedVectorDB with proper config
-        embedding = await asyncio.get_event_loop().run_in_executor(
-            vector_db_instance._executor,
-            lambda: vector_db_instance.model.encode(text, show_progress_bar=False)
-        )
-        return embedding.tolist()
+        vector_db_instance = get_vector_db()
+        embedding = vector_db_instance.query_cache.get(text)
+        if embedding is None:
+            embedding = vector_db_instance.query_cache.put(
+                text,
+                await vector_db_instance.batcher.encode(text)
+            )
+        return embedding
     except Exception as e:
         logger.error(f"Error generating query embeddings: {str(e)}")
-        return []
+        return None
 
 
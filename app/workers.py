@@ -3,16 +3,25 @@ import dramatiq
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 import logging
-from uuid import uuid4
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from uuid import UUID, uuid4, uuid5
 from pydantic import BaseModel
 
+try:
+    import uvloop
+except ImportError:  # uvloop is optional; fall back to the default loop
+    uvloop = None
+
 from app.utils.vector_db import (
-    EnhancedVectorDB,
     ChatMessage,
     MessageType,
-    VectorDBConfig
+    get_vector_db
 )
+from app.utils.file_handler import extract_text_from_file
 from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document as LangchainDocument
 
 # Configure logging
@@ -32,14 +41,25 @@ class SearchQuery(BaseModel):
     limit: int = 5
     threshold: float = 0.7
 
-# Initialize vector database with custom configuration
-vector_db = EnhancedVectorDB(
-    config=VectorDBConfig(
-        collection_name="documents",
-        similarity_threshold=0.7,
-        batch_size=50
-    )
-)
+# Dramatiq runs actors on several threads per process, so each worker thread
+# keeps one event loop for its lifetime instead of asyncio.run() per message
+_thread_state = threading.local()
+
+# All worker-thread loops share one default executor
+_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+        loop.set_default_executor(_executor)
+        asyncio.set_event_loop(loop)
+        _thread_state.loop = loop
+    return loop
+
+def run_async(coro):
+    """Run a coroutine on the current worker thread's persistent event loop."""
+    return _get_event_loop().run_until_complete(coro)
 
 # Worker for processing a single document and storing it in the vector database
 @dramatiq.actor
@@ -48,7 +68,7 @@ def process_document_worker(doc_input: dict):
     Process and store a document in the vector database.
     """
     doc_input = DocumentInput(**doc_input)
-    asyncio.run(process_document(doc_input))
+    run_async(process_document(doc_input))
 
 async def process_document(doc_input: DocumentInput) -> bool:
     try:
@@ -61,7 +81,7 @@ async def process_document(doc_input: DocumentInput) -> bool:
             metadata=doc_input.metadata or {}
         )
 
-        success = await vector_db.embed_messages_batch([message])
+        success = await get_vector_db().embed_messages_batch([message], wait=False)
         if success:
             logger.info(f"Successfully stored document: {message.message_id}")
         else:
@@ -75,7 +95,7 @@ async def process_document(doc_input: DocumentInput) -> bool:
 # Worker for processing multiple documents in batch and storing them
 @dramatiq.actor
 def process_documents_batch_worker(documents: List[dict]):
-    asyncio.run(process_documents_batch(documents))
+    run_async(process_documents_batch(documents))
 
 async def process_documents_batch(documents: List[dict]) -> Dict[str, bool]:
     try:
@@ -91,7 +111,7 @@ async def process_documents_batch(documents: List[dict]) -> Dict[str, bool]:
             for doc in documents
         ]
 
-        success = await vector_db.embed_messages_batch(messages)
+        success = await get_vector_db().embed_messages_batch(messages, wait=False)
         return {msg.message_id: success for msg in messages}
 
     except Exception as e:
@@ -101,7 +121,7 @@ async def process_documents_batch(documents: List[dict]) -> Dict[str, bool]:
 # Worker for searching documents
 @dramatiq.actor
 def search_documents_worker(query: dict):
-    asyncio.run(search_documents(SearchQuery(**query)))
+    run_async(search_documents(SearchQuery(**query)))
 
 async def search_documents(query: SearchQuery) -> List[Document]:
     try:
@@ -111,7 +131,7 @@ async def search_documents(query: SearchQuery) -> List[Document]:
             else None
         )
 
-        results = await vector_db.semantic_search(
+        results = await get_vector_db().semantic_search(
             query=query.query,
             conversation_id=query.conversation_id,
             message_type=message_type,
@@ -135,11 +155,11 @@ async def search_documents(query: SearchQuery) -> List[Document]:
 # Worker for updating documents in the vector database
 @dramatiq.actor
 def update_document_worker(doc_id: str, content: str, metadata: Optional[Dict[str, Any]] = None):
-    asyncio.run(update_document(doc_id, content, metadata))
+    run_async(update_document(doc_id, content, metadata))
 
 async def update_document(doc_id: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
     try:
-        success = await vector_db.update_message(
+        success = await get_vector_db().update_message(
             message_id=doc_id,
             new_content=content,
             new_metadata=metadata
@@ -159,11 +179,11 @@ async def update_document(doc_id: str, content: str, metadata: Optional[Dict[str
 # Worker for deleting all documents in a conversation
 @dramatiq.actor
 def delete_conversation_documents_worker(conversation_id: str):
-    asyncio.run(delete_conversation_documents(conversation_id))
+    run_async(delete_conversation_documents(conversation_id))
 
 async def delete_conversation_documents(conversation_id: str) -> bool:
     try:
-        success = await vector_db.delete_conversation(conversation_id)
+        success = await get_vector_db().delete_conversation(conversation_id)
 
         if success:
             logger.info(f"Successfully deleted conversation: {conversation_id}")
@@ -176,27 +196,76 @@ async def delete_conversation_documents(conversation_id: str) -> bool:
         logger.error(f"Error deleting conversation: {str(e)}")
         return False
 
-# Worker for creating embeddings for a given text
+# Uploaded documents go through a three-stage pipeline: extract -> chunk -> embed.
+# Each stage's return value is appended to the next stage's arguments.
+def embed_document_pipeline(file_path: str, asset_id: str):
+    """Enqueue the extract -> chunk -> embed pipeline for an uploaded file."""
+    return dramatiq.pipeline([
+        extract_text_worker.message(file_path),
+        chunk_text_worker.message(),
+        embed_chunks_worker.message(asset_id, os.path.basename(file_path))
+    ]).run()
+
+# Extraction failures (unsupported, missing or corrupt files) won't succeed on
+# retry, so the error is logged and the pipeline stops without retrying
+@dramatiq.actor(max_retries=0)
+def extract_text_worker(file_path: str) -> str:
+    try:
+        return run_async(extract_text(file_path))
+
+    except Exception as e:
+        logger.error(f"Error extracting text from {file_path}: {str(e)}")
+        raise
+
+async def extract_text(file_path: str) -> str:
+    """Extract text from a file without blocking the event loop."""
+    return await asyncio.get_event_loop().run_in_executor(
+        None,
+        lambda: extract_text_from_file(file_path)
+    )
+
+@dramatiq.actor
+def chunk_text_worker(text: str) -> List[str]:
+    return chunk_text(text)
+
+def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 100) -> List[str]:
+    """Split extracted text into overlapping chunks for embedding."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.split_text(text)
+
 @dramatiq.actor
-def create_embeddings_worker(text: str, metadata: Optional[Dict[str, Any]] = None):
-    asyncio.run(create_embeddings(text, metadata))
+def embed_chunks_worker(asset_id: str, file_name: str, chunks: List[str]):
+    run_async(embed_chunks(asset_id, file_name, chunks))
 
-async def create_embeddings(text: str, metadata: Optional[Dict[str, Any]] = None) -> List[float]:
+async def embed_chunks(asset_id: str, file_name: str, chunks: List[str]) -> bool:
     try:
-        embeddings = await asyncio.get_event_loop().run_in_executor(
-            vector_db._executor,
-            lambda: vector_db.model.encode(text)
-        )
-        return embeddings.tolist()
+        messages = [
+            ChatMessage(
+                content=chunk,
+                message_type=MessageType.SYSTEM,
+                timestamp=datetime.now(),
+                message_id=str(uuid5(UUID(asset_id), str(index))),
+                conversation_id=asset_id,
+                metadata={"asset_id": asset_id, "file_name": file_name, "chunk_index": index}
+            )
+            for index, chunk in enumerate(chunks)
+        ]
+
+        success = await get_vector_db().embed_messages_batch(messages, wait=False, asset_id=asset_id)
+        if success:
+            logger.info(f"Successfully embedded {len(messages)} chunks for asset: {asset_id}")
+        else:
+            logger.error(f"Failed to embed chunks for asset: {asset_id}")
+        return success
 
     except Exception as e:
-        logger.error(f"Error creating embeddings: {str(e)}")
-        return []
+        logger.error(f"Error embedding chunks for asset {asset_id}: {str(e)}")
+        return False
 
 # Worker for storing embeddings
 @dramatiq.actor
 def store_embeddings_worker(asset_id: str, text: str, metadata: Optional[Dict[str, Any]] = None):
-    asyncio.run(store_embeddings(asset_id, text, metadata))
+    run_async(store_embeddings(asset_id, text, metadata))
 
 async def store_embeddings(asset_id: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
     try: